@@ -9,189 +9,269 @@ from __future__ import annotations
 
 import argparse
 import csv
+import heapq
 import json
+import mmap
+import os
 import re
+import stat
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Pattern, Tuple, Union
 
-RUN_START_RE = re.compile(r"^\[(\d+)/(\d+)\] Running (\S+) \.\.\.$")
-OOF_RE = re.compile(
-    r"Building OOF first-stage features.*seeds=\[(.*?)\], folds=(\d+), epochs=(\d+)\)\.\.\."
-)
-ENSEMBLE_AGG_RE = re.compile(r"Ensemble aggregation: (\w+)")
-ENSEMBLE_THRESH_RE = re.compile(r"Ensemble selected threshold: ([0-9.]+)")
-ENSEMBLE_SCORE_RE = re.compile(
-    r"Ensemble test score: (\d+) \(TP=(\d+), FN=(\d+), FP=(\d+), accounts=(\d+)\)"
-)
-SEED_SCORE_RE = re.compile(r"Seed score mean/std: ([0-9.]+) / ([0-9.]+)")
-PROFILE_MODE_RE = re.compile(r"Second-stage profile mode: (.+)$")
-PROFILE_SELECTED_RE = re.compile(r"Second-stage selected profile: (.+)$")
-BLEND_ALPHA_RE = re.compile(r"Second-stage blend alpha \(CatBoost weight\): ([0-9.]+)")
-SECOND_THRESH_RE = re.compile(r"Second-stage threshold: ([0-9.]+)")
-SECOND_SCORE_RE = re.compile(r"Second-stage test score: (\d+)/(\d+)")
-SECOND_CONF_RE = re.compile(r"Second-stage confusion components -> TP=(\d+), FN=(\d+), FP=(\d+)")
-SUMMARY_RE = re.compile(
-    r"^(week_sweep_\d+): booster=([0-9.]+), ensemble=([0-9.]+), gain=([-0-9.]+), dur=([0-9.]+)s"
-)
+try:
+    import orjson
+except ImportError:  # optional: falls back to the stdlib encoder
+    orjson = None
 
 
-def _parse_seeds(raw: str) -> List[int]:
-    raw = raw.strip()
-    if not raw:
-        return []
-    return [int(x.strip()) for x in raw.split(",") if x.strip()]
-
-
-def parse_output(path: Path) -> Dict[str, Any]:
-    raw_lines = path.read_text(encoding="utf-8", errors="replace").splitlines()
-    # Some logs wrap long lines with a trailing backslash and newline. Re-join them.
-    text: List[str] = []
-    carry: Optional[str] = None
-    for line in raw_lines:
-        if carry is not None:
-            line = carry + line
-            carry = None
-        if line.endswith("\\"):
-            carry = line[:-1]
-            continue
-        text.append(line)
-    if carry is not None:
-        text.append(carry)
+# Text captures (run names, profile names, aggregation modes) repeat across runs;
+# sharing one str per distinct value keeps the run dicts small.
+_TEXT_CACHE: Dict[bytes, str] = {}
+
+
+def _decode(raw: bytes) -> str:
+    text = _TEXT_CACHE.get(raw)
+    if text is None:
+        text = _TEXT_CACHE[raw] = sys.intern(raw.decode("utf-8", errors="replace"))
+    return text
+
+
+SEED_RE = re.compile(rb"\d+")
+
+
+def _parse_seeds(raw: bytes) -> List[int]:
+    # Seeds are non-negative integers, so one findall replaces split/strip/filter.
+    return list(map(int, SEED_RE.findall(raw)))
+
+
+CANDIDATE_PROFILES = frozenset({b"legacy", b"regularized"})
+
 
+def _parse_candidates(block: bytes) -> List[Dict[str, Any]]:
+    # SCAN_RE only hands over lines that start with a profile name, so each row
+    # costs a single split; the table ends at the first row that is not complete.
+    candidates: List[Dict[str, Any]] = []
+    for line in block.splitlines():
+        parts = line.split()
+        if parts[0] not in CANDIDATE_PROFILES or len(parts) < 11:
+            break
+        candidates.append(
+            {
+                "profile": _decode(parts[0]),
+                "alpha": float(parts[1]),
+                "threshold": float(parts[2]),
+                "val_score": float(parts[3]),
+                "val_tp_accounts": int(parts[4]),
+                "val_fn_accounts": int(parts[5]),
+                "val_fp_accounts": int(parts[6]),
+                "test_score": float(parts[7]),
+                "test_tp_accounts": int(parts[8]),
+                "test_fn_accounts": int(parts[9]),
+                "test_fp_accounts": int(parts[10]),
+            }
+        )
+    return candidates
+
+
+# Log patterns as (group name, pattern, ((field, converter), ...)). They are fused
+# into one multiline alternation and run over the whole text with a single finditer.
+# The shared "^" anchor is hoisted out of the branches so most offsets fail on a
+# single opcode instead of trying every branch.
+# Every capture is written so a token has exactly one way to match (no
+# "[0-9.]+" or ".*...(.*?)" pairs), so garbage lines fail without backtracking.
+FieldSpec = Tuple[Tuple[str, Callable[[bytes], Any]], ...]
+SCAN_PATTERNS: Tuple[Tuple[str, bytes, FieldSpec], ...] = (
+    (
+        "run_start",
+        rb"\[(\d+)/(\d+)\] Running (\S+) \.\.\.$",
+        (("run_index", int), ("run_total", int), ("run_name", _decode)),
+    ),
+    (
+        "summary",
+        rb"(week_sweep_\d+): booster=(\d+(?:\.\d*)?|\.\d+), ensemble=(\d+(?:\.\d*)?|\.\d+), "
+        rb"gain=(-?(?:\d+(?:\.\d*)?|\.\d+)), dur=(\d+(?:\.\d*)?|\.\d+)s",
+        (
+            ("run_name", _decode),
+            ("booster_score", float),
+            ("ensemble_score", float),
+            ("gain", float),
+            ("duration_s", float),
+        ),
+    ),
+    (
+        # The report header and its column-title line are consumed here so only
+        # the table rows themselves reach _parse_candidates.
+        "candidates",
+        rb"[ \t]*Second-stage candidate report.*\n(?:[ \t]*profile\b.*\n)?"
+        rb"((?:[ \t]*(?:legacy|regularized)\b.*(?:\n|$))*)",
+        (("candidates", _parse_candidates),),
+    ),
+    (
+        "oof",
+        rb"[ \t]*Building OOF first-stage features[^\[\n]*seeds=\[([^\]\n]*)\], folds=(\d+), epochs=(\d+)\)\.\.\.",
+        (("oof_seeds", _parse_seeds), ("folds", int), ("epochs", int)),
+    ),
+    ("ensemble_agg", rb"[ \t]*Ensemble aggregation: (\w+)", (("ensemble_agg", _decode),)),
+    (
+        "ensemble_thresh",
+        rb"[ \t]*Ensemble selected threshold: (\d+(?:\.\d*)?|\.\d+)",
+        (("ensemble_threshold", float),),
+    ),
+    (
+        "ensemble_score",
+        rb"[ \t]*Ensemble test score: (\d+) \(TP=(\d+), FN=(\d+), FP=(\d+), accounts=(\d+)\)",
+        (
+            ("ensemble_score", float),
+            ("ensemble_tp", int),
+            ("ensemble_fn", int),
+            ("ensemble_fp", int),
+            ("ensemble_accounts", int),
+        ),
+    ),
+    (
+        "seed_score",
+        rb"[ \t]*Seed score mean/std: (\d+(?:\.\d*)?|\.\d+) / (\d+(?:\.\d*)?|\.\d+)",
+        (("seed_score_mean", float), ("seed_score_std", float)),
+    ),
+    ("profile_mode", rb"[ \t]*Second-stage profile mode: (.+)$", (("profile_mode", _decode),)),
+    (
+        "profile_selected",
+        rb"[ \t]*Second-stage selected profile: (.+)$",
+        (("selected_profile", _decode),),
+    ),
+    (
+        "blend_alpha",
+        rb"[ \t]*Second-stage blend alpha \(CatBoost weight\): (\d+(?:\.\d*)?|\.\d+)",
+        (("blend_alpha", float),),
+    ),
+    (
+        "second_thresh",
+        rb"[ \t]*Second-stage threshold: (\d+(?:\.\d*)?|\.\d+)",
+        (("second_threshold", float),),
+    ),
+    (
+        "second_score",
+        rb"[ \t]*Second-stage test score: (\d+)/(\d+)",
+        (("booster_score", float), ("booster_max", int)),
+    ),
+    (
+        "second_conf",
+        rb"[ \t]*Second-stage confusion components -> TP=(\d+), FN=(\d+), FP=(\d+)",
+        (("second_tp", int), ("second_fn", int), ("second_fp", int)),
+    ),
+)
+# Literal prefixes shared by several SCAN_PATTERNS branches. re tries alternation
+# branches one at a time, so factoring these out routes a line with one compare.
+SCAN_PREFIXES = (rb"[ \t]*Second-stage ", rb"[ \t]*Ensemble ")
+
+
+def _compile_scan(patterns: Tuple[Tuple[str, bytes, FieldSpec], ...]) -> Pattern[bytes]:
+    grouped: Dict[bytes, List[bytes]] = {}
+    for name, pattern, _ in patterns:
+        prefix = next((p for p in SCAN_PREFIXES if pattern.startswith(p)), b"")
+        grouped.setdefault(prefix, []).append(b"(?P<%s>%s)" % (name.encode(), pattern[len(prefix) :]))
+    branches = [
+        prefix + b"(?:" + b"|".join(alts) + b")" if prefix else b"|".join(alts)
+        for prefix, alts in grouped.items()
+    ]
+    return re.compile(b"^(?:" + b"|".join(branches) + b")", re.MULTILINE)
+
+
+SCAN_RE = _compile_scan(SCAN_PATTERNS)
+SCAN_FIELDS: Dict[str, FieldSpec] = {name: fields for name, _, fields in SCAN_PATTERNS}
+# Same line as the run_start branch; used to find chunk boundaries for --jobs.
+RUN_START_LINE_RE = re.compile(rb"^\[\d+/\d+\] Running \S+ \.\.\.$", re.MULTILINE)
+
+
+def parse_output(path: Path, with_candidates: bool = True, jobs: int = 1) -> Dict[str, Any]:
+    with path.open("rb") as f:
+        st = os.fstat(f.fileno())
+        # Only regular files can be mapped; pipes, FIFOs and /dev/stdin report size 0
+        # and are read through the fallback below instead.
+        if stat.S_ISREG(st.st_mode):
+            if st.st_size == 0:
+                return {"runs": [], "incomplete": []}
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if mm.find(b"\\\n") == -1 and mm.find(b"\r") == -1:
+                    if jobs > 1:
+                        return _scan_parallel(path, _chunk_bounds(mm, jobs), with_candidates)
+                    return _scan_runs(mm, with_candidates)
+        # Streamed input, and logs that wrap long lines with a trailing backslash and
+        # newline or use CRLF line endings, need a normalized copy instead of the
+        # mapping; build it in one streaming pass so only that copy is ever held.
+        data = bytearray()
+        for line in f:
+            data += line.replace(b"\r\n", b"\n").replace(b"\r", b"\n").replace(b"\\\n", b"")
+    return _scan_runs(data, with_candidates)
+
+
+def _chunk_bounds(buf: mmap.mmap, jobs: int) -> List[int]:
+    # Runs are independent once a run-start line is seen, so the file can be cut
+    # at those lines into at most ``jobs`` contiguous byte ranges.
+    starts = [m.start() for m in RUN_START_LINE_RE.finditer(buf)]
+    cuts = sorted({starts[i * len(starts) // jobs] for i in range(1, jobs)} - {0}) if starts else []
+    return [0, *cuts, len(buf)]
+
+
+def _scan_file_slice(path: Path, start: int, end: int, with_candidates: bool) -> Dict[str, Any]:
+    with path.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return _scan_runs(mm, with_candidates, start, end)
+
+
+def _scan_parallel(path: Path, bounds: List[int], with_candidates: bool) -> Dict[str, Any]:
+    if len(bounds) <= 2:
+        return _scan_file_slice(path, bounds[0], bounds[-1], with_candidates)
+    with ProcessPoolExecutor(max_workers=len(bounds) - 1) as pool:
+        parts = list(
+            pool.map(_scan_file_slice, repeat(path), bounds[:-1], bounds[1:], repeat(with_candidates))
+        )
+    runs = [run for part in parts for run in part["runs"]]
+    # A run still open at a chunk boundary is dropped by the next run start, exactly
+    # as in a serial scan, so only the last chunk can leave an incomplete run.
+    return {"runs": runs, "incomplete": parts[-1]["incomplete"]}
+
+
+def _scan_runs(
+    buf: Union[bytes, bytearray, mmap.mmap], with_candidates: bool, start: int = 0, end: int = sys.maxsize
+) -> Dict[str, Any]:
     runs: List[Dict[str, Any]] = []
     incomplete: List[Dict[str, Any]] = []
     current: Optional[Dict[str, Any]] = None
-    in_candidates = False
 
-    def finalize_current() -> None:
-        nonlocal current
-        if not current:
-            return
-        runs.append(current)
-        current = None
-
-    for line in text:
-        line = line.rstrip("\n")
+    for m in SCAN_RE.finditer(buf, start, end):
+        name = m.lastgroup
+        if name == "candidates" and not with_candidates:
+            # the regex still consumes the block; only the row parsing is skipped
+            continue
+        # Field captures follow the named branch group in declaration order.
+        fields = SCAN_FIELDS[name]
+        first = m.lastindex
+        values = m.groups()[first : first + len(fields)]
 
-        m = RUN_START_RE.match(line)
-        if m:
+        if name == "run_start":
             # start a new run, but don't finalize until summary line
-            current = {
-                "run_index": int(m.group(1)),
-                "run_total": int(m.group(2)),
-                "run_name": m.group(3),
-                "candidates": [],
-            }
-            in_candidates = False
+            current = {key: convert(value) for (key, convert), value in zip(fields, values)}
+            if with_candidates:
+                current["candidates"] = []
             continue
 
         if current is None:
             # still allow summary parsing if run start missing
-            sm = SUMMARY_RE.match(line)
-            if sm:
-                current = {"run_name": sm.group(1), "candidates": []}
-            else:
+            if name != "summary":
                 continue
+            current = {"run_name": values[0]}
+            if with_candidates:
+                current["candidates"] = []
 
-        # candidate table parsing
-        if line.strip().startswith("Second-stage candidate report"):
-            in_candidates = True
-            continue
-        if in_candidates:
-            if not line.strip() or line.strip().startswith("Baseline account-level"):
-                in_candidates = False
-                continue
-            parts = line.split()
-            if not parts:
-                continue
-            if parts[0] == "profile":
-                continue
-            if parts[0] in {"legacy", "regularized"} and len(parts) >= 11:
-                cand = {
-                    "profile": parts[0],
-                    "alpha": float(parts[1]),
-                    "threshold": float(parts[2]),
-                    "val_score": float(parts[3]),
-                    "val_tp_accounts": int(parts[4]),
-                    "val_fn_accounts": int(parts[5]),
-                    "val_fp_accounts": int(parts[6]),
-                    "test_score": float(parts[7]),
-                    "test_tp_accounts": int(parts[8]),
-                    "test_fn_accounts": int(parts[9]),
-                    "test_fp_accounts": int(parts[10]),
-                }
-                current.setdefault("candidates", []).append(cand)
-                continue
-            # not a candidate row; fall back to normal parsing
-            in_candidates = False
-
-        m = OOF_RE.search(line)
-        if m:
-            current["oof_seeds"] = _parse_seeds(m.group(1))
-            current["folds"] = int(m.group(2))
-            current["epochs"] = int(m.group(3))
-            continue
-
-        m = ENSEMBLE_AGG_RE.search(line)
-        if m:
-            current["ensemble_agg"] = m.group(1)
-            continue
-        m = ENSEMBLE_THRESH_RE.search(line)
-        if m:
-            current["ensemble_threshold"] = float(m.group(1))
-            continue
-        m = ENSEMBLE_SCORE_RE.search(line)
-        if m:
-            current["ensemble_score"] = float(m.group(1))
-            current["ensemble_tp"] = int(m.group(2))
-            current["ensemble_fn"] = int(m.group(3))
-            current["ensemble_fp"] = int(m.group(4))
-            current["ensemble_accounts"] = int(m.group(5))
-            continue
-
-        m = SEED_SCORE_RE.search(line)
-        if m:
-            current["seed_score_mean"] = float(m.group(1))
-            current["seed_score_std"] = float(m.group(2))
-            continue
-
-        m = PROFILE_MODE_RE.search(line)
-        if m:
-            current["profile_mode"] = m.group(1)
-            continue
-        m = PROFILE_SELECTED_RE.search(line)
-        if m:
-            current["selected_profile"] = m.group(1)
-            continue
-        m = BLEND_ALPHA_RE.search(line)
-        if m:
-            current["blend_alpha"] = float(m.group(1))
-            continue
-        m = SECOND_THRESH_RE.search(line)
-        if m:
-            current["second_threshold"] = float(m.group(1))
-            continue
-        m = SECOND_SCORE_RE.search(line)
-        if m:
-            current["booster_score"] = float(m.group(1))
-            current["booster_max"] = int(m.group(2))
-            continue
-        m = SECOND_CONF_RE.search(line)
-        if m:
-            current["second_tp"] = int(m.group(1))
-            current["second_fn"] = int(m.group(2))
-            current["second_fp"] = int(m.group(3))
-            continue
+        for (key, convert), value in zip(fields, values):
+            current[key] = convert(value)
 
-        m = SUMMARY_RE.match(line)
-        if m:
-            current["run_name"] = m.group(1)
-            current["booster_score"] = float(m.group(2))
-            current["ensemble_score"] = float(m.group(3))
-            current["gain"] = float(m.group(4))
-            current["duration_s"] = float(m.group(5))
-            finalize_current()
-            continue
+        if name == "summary":
+            runs.append(current)
+            current = None
 
     # handle incomplete run if present
     if current is not None:
@@ -200,6 +280,15 @@ def parse_output(path: Path) -> Dict[str, Any]:
     return {"runs": runs, "incomplete": incomplete}
 
 
+def _dumps(obj: Any, indent: bool = False) -> str:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0).decode("utf-8")
+    # Match orjson's output byte for byte so the files don't depend on what is installed.
+    if indent:
+        return json.dumps(obj, indent=2, ensure_ascii=False)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
+
 def write_csv(rows: List[Dict[str, Any]], path: Path) -> None:
     fieldnames = [
         "run_index",
@@ -229,29 +318,46 @@ def write_csv(rows: List[Dict[str, Any]], path: Path) -> None:
         "seed_score_std",
         "candidates",
     ]
-    with path.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
+    seeds_col = fieldnames.index("oof_seeds")
+    candidates_col = fieldnames.index("candidates")
+    # A 1 MiB buffer lets large sweeps flush in a few big writes instead of one per 8 KiB.
+    with path.open("w", newline="", encoding="utf-8", buffering=1 << 20) as f:
+        writer = csv.writer(f)
+        writer.writerow(fieldnames)
         for row in rows:
-            flat = dict(row)
-            if "oof_seeds" in flat:
-                flat["oof_seeds"] = ",".join(str(s) for s in flat["oof_seeds"])
-            if "candidates" in flat:
-                flat["candidates"] = json.dumps(flat["candidates"], ensure_ascii=True)
-            writer.writerow({k: flat.get(k, "") for k in fieldnames})
+            values = [row.get(k, "") for k in fieldnames]
+            if "oof_seeds" in row:
+                values[seeds_col] = ",".join(str(s) for s in row["oof_seeds"])
+            if "candidates" in row:
+                values[candidates_col] = _dumps(row["candidates"])
+            writer.writerow(values)
+
+
+def _rank_key(r: Dict[str, Any]) -> tuple:
+    booster = r.get("booster_score", float("-inf"))
+    gain = r.get("gain", float("-inf"))
+    fp = r.get("second_fp", float("inf"))
+    return (booster, gain, -fp)
+
+
+def top_runs(runs: List[Dict[str, Any]], n: int) -> List[Dict[str, Any]]:
+    # One partial ranking pass, O(n log k); ties keep input order.
+    return heapq.nlargest(n, runs, key=_rank_key)
 
 
 def select_best(runs: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
-    if not runs:
-        return None
+    ranked = top_runs(runs, 1)
+    return ranked[0] if ranked else None
 
-    def key(r: Dict[str, Any]) -> tuple:
-        booster = r.get("booster_score", float("-inf"))
-        gain = r.get("gain", float("-inf"))
-        fp = r.get("second_fp", float("inf"))
-        return (booster, gain, -fp)
 
-    return max(runs, key=key)
+def _non_negative_int(raw: str) -> int:
+    try:
+        value = int(raw)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected an integer, got {raw!r}") from None
+    if value < 0:
+        raise argparse.ArgumentTypeError(f"must be >= 0, got {value}")
+    return value
 
 
 def main() -> None:
@@ -259,9 +365,21 @@ def main() -> None:
     parser.add_argument("input", type=Path, help="Path to sweep output txt")
     parser.add_argument("--out-dir", type=Path, default=Path("artifacts"))
     parser.add_argument("--top-n", type=int, default=10)
+    parser.add_argument(
+        "--no-candidates",
+        action="store_true",
+        help="Skip parsing the second-stage candidate tables (leaves the candidates column empty)",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=_non_negative_int,
+        default=1,
+        help="Parse with this many worker processes (0 = one per CPU)",
+    )
     args = parser.parse_args()
 
-    results = parse_output(args.input)
+    jobs = args.jobs or os.cpu_count() or 1
+    results = parse_output(args.input, with_candidates=not args.no_candidates, jobs=jobs)
     runs = results["runs"]
     incomplete = results["incomplete"]
 
@@ -269,14 +387,16 @@ def main() -> None:
     csv_path = args.out_dir / "booster_sweep_parsed.csv"
     write_csv(runs, csv_path)
 
-    best = select_best(runs)
+    # Rank once; the best run is picked from the top-N rather than all runs.
+    ranked = top_runs(runs, max(args.top_n, 1))
+    best = select_best(ranked)
     best_path = args.out_dir / "booster_sweep_best.json"
     if best is not None:
-        best_path.write_text(json.dumps(best, indent=2, ensure_ascii=True), encoding="utf-8")
+        best_path.write_text(_dumps(best, indent=True), encoding="utf-8")
 
     incomplete_path = args.out_dir / "booster_sweep_incomplete.json"
     if incomplete:
-        incomplete_path.write_text(json.dumps(incomplete, indent=2, ensure_ascii=True), encoding="utf-8")
+        incomplete_path.write_text(_dumps(incomplete, indent=True), encoding="utf-8")
 
     # Print quick summary
     print(f"Parsed runs: {len(runs)}")
@@ -287,7 +407,7 @@ def main() -> None:
         print(f"Best: {best.get('run_name')} booster={best.get('booster_score')} gain={best.get('gain')} profile={best.get('selected_profile')} threshold={best.get('second_threshold')} seeds={best.get('oof_seeds')} folds={best.get('folds')} epochs={best.get('epochs')}")
 
     # top-N by booster score
-    top_n = sorted(runs, key=lambda r: (r.get("booster_score", -1), r.get("gain", -1)), reverse=True)[: args.top_n]
+    top_n = ranked[: args.top_n]
     print("Top runs:")
     for r in top_n:
         print(